@@ -1,90 +1,181 @@
 # last updated: 2025-06-03
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
 import io
-import tempfile
-import os
+import hashlib
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+
+# シーケンス番号ごとの表示情報（キーは int8 のシーケンス番号）
+SEQUENCE_MAP = {
+    0: {'label': '待機中', 'color': '#6B7280', 'bg_color': '#F3F4F6'},
+    1: {'label': '初期化', 'color': '#2563EB', 'bg_color': '#DBEAFE'},
+    2: {'label': '加工準備', 'color': '#D97706', 'bg_color': '#FEF3C7'},
+    3: {'label': '加工中', 'color': '#EA580C', 'bg_color': '#FED7AA'},
+    4: {'label': '加工完了', 'color': '#16A34A', 'bg_color': '#DCFCE7'}
+}
+UNKNOWN_SEQ = {'label': '不明', 'color': '#DC2626', 'bg_color': '#FEE2E2'}
+SEQUENCE_LABELS = {seq: info['label'] for seq, info in SEQUENCE_MAP.items()}
+SEQUENCE_CODES = list(SEQUENCE_MAP)
+# CSV上のシーケンス文字列（2桁固定）とコードの対応、これ以外は UNKNOWN_SEQ_CODE とする
+SEQUENCE_STRINGS = {f"{seq:02d}": seq for seq in SEQUENCE_MAP}
+UNKNOWN_SEQ_CODE = -1
+# CSVの列（タイムスタンプ, ID, 種別, シーケンス, タグID）
+CSV_COLUMNS = ['ts', 'id', 'type', 'seq', 'tag']
 
 def parse_uploaded_files(uploaded_files):
     """アップロードされたCSVファイルを解析"""
+    # ファイル名とバイト列をキーにして、再実行時はキャッシュ済みの結果を使う
+    payload = tuple((uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files)
+    return _parse_cached(payload)
+
+def _read_rows(content, names):
+    """CSVのバイト列をCエンジンで一括読み込み"""
+    # 引用符は特別扱いせず、NA/null などの文字列もタグIDとしてそのまま残す（空欄のみ欠損扱い）
+    return pd.read_csv(
+        io.BytesIO(content),
+        header=None,
+        names=names,
+        index_col=False,
+        dtype='string',
+        engine='c',
+        quoting=csv.QUOTE_NONE,
+        keep_default_na=False,
+        na_values=['']
+    )
+
+def _max_field_count(content):
+    """最も長い行の列数を返す（行ごとのループを使わずにnumpyで数える）"""
+    buf = np.frombuffer(content, dtype=np.uint8)
+    comma_total = np.cumsum(buf == ord(','))
+    line_ends = np.append(np.flatnonzero(buf == ord('\n')), len(buf) - 1)
+    return int(np.diff(comma_total[line_ends], prepend=0).max()) + 1
+
+def _parse_one_file(file_info):
+    """1ファイル分のCSVを解析して (ファイル名, タイムスタンプ, シーケンス, タグID配列) を返す（対象外のファイルは None）"""
+    filename = file_info['name']
+    content = file_info['content']
+    
+    if not content.strip():
+        return None
+    
+    # 通常は5列分の列名で読み込む（6列目以降は読み捨て、タグ列のない行はNAになる）
+    # 1行目から6列以上ある場合も ParserWarning が出るだけで、先頭5列はずれずに読める
+    try:
+        df = _read_rows(content, CSV_COLUMNS)
+    except pd.errors.ParserError:
+        # 途中に6列以上の行があると失敗するので、最も長い行に合わせて読み直す
+        names = CSV_COLUMNS + [f'extra{i}' for i in range(_max_field_count(content) - len(CSV_COLUMNS))]
+        df = _read_rows(content, names)
+    
+    if pd.isna(df['seq'].iloc[0]):
+        return None
+        
+    timestamp = df['ts'].iloc[0]
+    sequence = df['seq'].iloc[0]
     
-    all_data = []
-    tag_histories = {}
+    # タグIDを抽出（1行目はヘッダー扱い）
+    tag_ids = df['tag'].iloc[1:].dropna().to_numpy(dtype=object)
+    
+    return filename, timestamp, sequence, tag_ids
+
+@st.cache_data(show_spinner=False)
+def _parse_cached(payload):
+    """(ファイル名, バイト列) のタプルからCSVを解析"""
+    
+    # 列ごとにファイル単位の値を集め、最後に一度だけDataFrameを作る
+    filenames = []
+    raw_timestamps = []
+    sequences = []
+    tag_parts = []
     
     # ファイルを日時順にソート
     file_data = []
-    for uploaded_file in uploaded_files:
-        content = uploaded_file.read().decode('utf-8')
+    for name, content in payload:
         file_data.append({
-            'name': uploaded_file.name,
+            'name': name,
             'content': content
         })
     
     # ファイル名でソート（タイムスタンプが含まれている前提）
-    file_data.sort(key=lambda x: x['name'])
+    file_data.sort(key=itemgetter('name'))
     
-    for file_info in file_data:
+    # ファイルごとの解析は並列に実行（read_csv の C パーサーは GIL を解放する）
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(file_data)))) as executor:
+        futures = [executor.submit(_parse_one_file, file_info) for file_info in file_data]
+    
+    # 結果はファイル名順に取り出し、警告はスクリプトのスレッドから表示する
+    for file_info, future in zip(file_data, futures):
         try:
-            filename = file_info['name']
-            content = file_info['content'].strip()
-            
-            if not content:
-                continue
-                
-            lines = content.split('\n')
-            headers = lines[0].split(',')
-            
-            if len(headers) < 4:
-                continue
-                
-            timestamp = headers[0]
-            sequence = headers[3]
-            data_rows = lines[1:]
-            
-            # タイムスタンプを整形
-            try:
-                dt = datetime.strptime(timestamp, '%Y%m%d%H%M%S')
-                formatted_time = dt.strftime('%Y/%m/%d %H:%M:%S')
-            except:
-                formatted_time = timestamp
-            
-            # タグIDを抽出
-            tag_ids = []
-            for row in data_rows:
-                if row.strip():
-                    columns = row.split(',')
-                    if len(columns) > 4 and columns[4]:
-                        tag_id = columns[4].replace('\r', '')
-                        tag_ids.append(tag_id)
-                        
-                        # タグ履歴を記録
-                        if tag_id not in tag_histories:
-                            tag_histories[tag_id] = []
-                        tag_histories[tag_id].append({
-                            'timestamp': formatted_time,
-                            'datetime': dt,
-                            'sequence': sequence,
-                            'filename': filename
-                        })
-            
-            all_data.append({
-                'filename': filename,
-                'timestamp': formatted_time,
-                'datetime': dt,
-                'sequence': sequence,
-                'tag_count': len(tag_ids),
-                'tag_ids': tag_ids,
-                'raw_timestamp': timestamp
-            })
-            
+            result = future.result()
         except Exception as e:
-            st.warning(f"ファイル {filename} の読み込みでエラー: {e}")
+            st.warning(f"ファイル {file_info['name']} の読み込みでエラー: {e}")
             continue
-    
-    return all_data, tag_histories
+        
+        if result is None:
+            continue
+        
+        filename, timestamp, sequence, tag_ids = result
+        filenames.append(filename)
+        raw_timestamps.append(timestamp)
+        sequences.append(sequence)
+        tag_parts.append(tag_ids)
+    
+    # 計測ごとのレコードを列指向のDataFrameにまとめる（表示用に元のシーケンス文字列も保持）
+    raw_sequences = pd.Series(sequences, dtype='string')
+    records_df = pd.DataFrame({
+        'filename': filenames,
+        'sequence': _parse_sequence(raw_sequences),
+        'raw_sequence': raw_sequences.astype('category'),
+        'tag_count': np.fromiter(map(len, tag_parts), dtype='int32', count=len(tag_parts)),
+        'raw_timestamp': pd.Series(raw_timestamps, dtype='string')
+    })
+    
+    # タイムスタンプを全ファイル分まとめて変換（解釈できないものは元の文字列を表示）
+    records_df['datetime'] = pd.to_datetime(records_df['raw_timestamp'], format='%Y%m%d%H%M%S', errors='coerce', cache=True)
+    records_df['timestamp'] = records_df['datetime'].dt.strftime('%Y/%m/%d %H:%M:%S').fillna(records_df['raw_timestamp'])
+    
+    # 日時順に一度だけ並べ替え、以降の処理はこの順序を前提にする
+    # （日時を解釈できないレコードは先頭に置き、最新レコードや継続時間の計算に影響させない）
+    records_df = records_df.sort_values('datetime', kind='mergesort', na_position='first')
+    
+    # タグは (レコード番号, タグID) の縦持ちで保持
+    tags_df = _build_tags_frame([tag_parts[i] for i in records_df.index])
+    records_df = records_df.reset_index(drop=True)
+    
+    return records_df, tags_df
+
+def _parse_sequence(values):
+    """シーケンス番号の文字列を int8 に変換（'00'-'04' と完全一致しないものは UNKNOWN_SEQ_CODE）"""
+    return values.astype(object).map(SEQUENCE_STRINGS).fillna(UNKNOWN_SEQ_CODE).astype('int8')
+
+def _build_tags_frame(tag_parts):
+    """レコードごとのタグIDから (record_idx, tag_id) の縦持ちDataFrameを作成"""
+    tag_parts = [np.asarray(tag_ids, dtype=object) for tag_ids in tag_parts]
+    counts = [len(tag_ids) for tag_ids in tag_parts]
+    tag_ids = np.concatenate(tag_parts) if tag_parts else np.array([], dtype=object)
+    return pd.DataFrame({
+        'record_idx': np.repeat(np.arange(len(tag_parts), dtype='int64'), counts),
+        'tag_id': pd.Categorical(tag_ids)
+    })
+
+def get_tag_history(records_df, tags_df, tag_id):
+    """指定したタグの検出履歴を取得（表示するタグについてだけ作成する）"""
+    record_idx = tags_df.loc[tags_df['tag_id'] == tag_id, 'record_idx']
+    return records_df.loc[record_idx, ['timestamp', 'datetime', 'sequence', 'raw_sequence', 'filename']]
+
+def get_top_tags(tags_df, n=5):
+    """検出回数の多いタグ上位n件を取得（同数の場合は最初に検出された順）"""
+    tag_counts = tags_df.groupby('tag_id', sort=False, observed=True).size()
+    return tag_counts.nlargest(n, keep='first')
+
+def format_tag_id(tag_id):
+    """長いタグIDを先頭・末尾8文字に省略"""
+    return tag_id[:8] + "..." + tag_id[-8:] if len(tag_id) > 20 else tag_id
 
 def parse_sample_data():
     """サンプルデータを生成（デモ用）"""
@@ -96,69 +187,107 @@ def parse_sample_data():
         {'filename': 'sample5.csv', 'timestamp': '2025/02/18 08:05:48', 'sequence': '04', 'tag_count': 3, 'tag_ids': ['A0250212153633343032353031303236', 'A0250212154400343032353031303330', 'A025021310432700323032353032313030363031']},
     ]
     
-    tag_histories = {}
-    for data in sample_data:
-        dt = datetime.strptime(data['timestamp'], '%Y/%m/%d %H:%M:%S')
-        data['datetime'] = dt
-        
-        for tag_id in data['tag_ids']:
-            if tag_id not in tag_histories:
-                tag_histories[tag_id] = []
-            tag_histories[tag_id].append({
-                'timestamp': data['timestamp'],
-                'datetime': dt,
-                'sequence': data['sequence'],
-                'filename': data['filename']
-            })
+    records_df = pd.DataFrame(sample_data)
+    records_df['datetime'] = pd.to_datetime(records_df['timestamp'], format='%Y/%m/%d %H:%M:%S', errors='coerce', cache=True)
+    records_df['raw_sequence'] = records_df['sequence'].astype('category')
+    records_df['sequence'] = _parse_sequence(records_df['sequence'])
+    records_df = records_df.sort_values('datetime', kind='mergesort', na_position='first', ignore_index=True)
+    tags_df = _build_tags_frame(records_df.pop('tag_ids'))
     
-    return sample_data, tag_histories
+    return records_df, tags_df
 
+@lru_cache(maxsize=8)
 def get_sequence_info(seq):
     """シーケンス情報を取得"""
-    sequence_map = {
-        '00': {'label': '待機中', 'color': '#6B7280', 'bg_color': '#F3F4F6'},
-        '01': {'label': '初期化', 'color': '#2563EB', 'bg_color': '#DBEAFE'},
-        '02': {'label': '加工準備', 'color': '#D97706', 'bg_color': '#FEF3C7'},
-        '03': {'label': '加工中', 'color': '#EA580C', 'bg_color': '#FED7AA'},
-        '04': {'label': '加工完了', 'color': '#16A34A', 'bg_color': '#DCFCE7'}
-    }
-    return sequence_map.get(seq, {'label': '不明', 'color': '#DC2626', 'bg_color': '#FEE2E2'})
+    return SEQUENCE_MAP.get(seq, UNKNOWN_SEQ)
 
-def calculate_sequence_stats(data):
-    """シーケンス別統計を計算"""
-    if not data:
+def calculate_sequence_stats(records_df):
+    """シーケンス別統計を計算（records_df は日時順に並んでいる前提）"""
+    if records_df.empty:
         return {}
-    
-    df = pd.DataFrame(data)
-    df = df.sort_values('datetime')
-    
-    stats = {}
-    
-    for seq in ['00', '01', '02', '03', '04']:
-        seq_data = df[df['sequence'] == seq]
-        count = len(seq_data)
-        
-        # 継続時間を計算
-        total_duration = 0
-        if count > 0:
-            for i in range(len(df)):
-                if df.iloc[i]['sequence'] == seq and i < len(df) - 1:
-                    duration = (df.iloc[i+1]['datetime'] - df.iloc[i]['datetime']).total_seconds() / 60
-                    total_duration += duration
-        
-        stats[seq] = {
-            'count': count,
-            'percentage': (count / len(df) * 100) if len(df) > 0 else 0,
-            'total_duration': total_duration,
-            'avg_duration': total_duration / count if count > 0 else 0
+
+    # 各レコードの継続時間（次のレコードまでの分数、最終レコードは0）
+    durations = records_df['datetime'].diff().shift(-1).dt.total_seconds().div(60).fillna(0)
+    grouped = durations.groupby(records_df['sequence'])
+
+    totals = grouped.sum().reindex(SEQUENCE_CODES, fill_value=0)
+    counts = grouped.size().reindex(SEQUENCE_CODES, fill_value=0)
+
+    count_pct = counts.div(len(records_df)).mul(100)
+    avg_durations = totals.div(counts).fillna(0)
+    time_pct = totals.div(totals.sum()).mul(100).fillna(0)
+
+    return {
+        seq: {
+            'count': int(count),
+            'percentage': pct,
+            'total_duration': total,
+            'avg_duration': avg,
+            'time_percentage': t_pct
         }
-    
-    # 時間の割合を計算
-    total_time = sum(stat['total_duration'] for stat in stats.values())
-    for seq in stats:
-        stats[seq]['time_percentage'] = (stats[seq]['total_duration'] / total_time * 100) if total_time > 0 else 0
-    
-    return stats
+        for seq, count, pct, total, avg, t_pct in zip(SEQUENCE_CODES, counts, count_pct, totals, avg_durations, time_pct)
+    }
+
+def _content_key(*arrays):
+    """配列の中身から軽量なキャッシュキーを作成"""
+    digest = hashlib.blake2b(digest_size=16)
+    for values in arrays:
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+# グラフは変更せずに使い回すので、pickle しない cache_resource に保持する
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_pie(labels, values, colors):
+    """シーケンス別時間割合の円グラフを作成"""
+    fig = go.Figure(data=[go.Pie(
+        labels=labels,
+        values=values,
+        marker_colors=colors,
+        hole=0.3
+    )])
+    fig.update_layout(
+        title="シーケンス別時間割合",
+        showlegend=True,
+        height=400
+    )
+    return fig
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_sequence_line(key, _datetimes, _sequences):
+    """シーケンス推移のグラフを作成（配列は key で識別する）"""
+    fig = go.Figure(go.Scattergl(
+        x=_datetimes,
+        y=_sequences,
+        mode='lines+markers'
+    ))
+    fig.update_layout(
+        title='シーケンス推移',
+        xaxis_title='時刻',
+        yaxis_title='シーケンス',
+        yaxis=dict(tickmode='array', tickvals=SEQUENCE_CODES),
+        height=400
+    )
+    return fig
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_tag_count_bar(key, _datetimes, _tag_counts):
+    """検出タグ数推移のグラフを作成（配列は key で識別する）"""
+    fig = go.Figure(go.Bar(
+        x=_datetimes,
+        y=_tag_counts,
+        marker=dict(
+            color=_tag_counts,
+            colorscale='Viridis',
+            colorbar=dict(title='タグ数')
+        )
+    ))
+    fig.update_layout(
+        title='検出タグ数推移',
+        xaxis_title='時刻',
+        yaxis_title='タグ数',
+        height=400
+    )
+    return fig
 
 def main():
     st.set_page_config(
@@ -189,10 +318,10 @@ def main():
     if uploaded_files:
         st.sidebar.success(f"✅ {len(uploaded_files)}個のファイルがアップロードされました")
         with st.spinner("データを解析中..."):
-            data, tag_histories = parse_uploaded_files(uploaded_files)
+            records_df, tags_df = parse_uploaded_files(uploaded_files)
     elif use_demo_data:
         st.sidebar.info("🎯 デモデータを使用中")
-        data, tag_histories = parse_sample_data()
+        records_df, tags_df = parse_sample_data()
     else:
         st.sidebar.warning("⚠️ CSVファイルをアップロードしてください")
         
@@ -218,33 +347,34 @@ def main():
         """)
         return
     
-    if not data:
+    if records_df.empty:
         st.error("❌ 有効なデータが見つかりません。CSVファイルの形式を確認してください。")
         return
     
     # データ概要
     st.sidebar.markdown("### 📊 データ概要")
-    st.sidebar.metric("ファイル数", len(set(item['filename'] for item in data)))
-    st.sidebar.metric("レコード数", len(data))
-    st.sidebar.metric("ユニークタグ数", len(tag_histories))
+    st.sidebar.metric("ファイル数", records_df['filename'].nunique())
+    st.sidebar.metric("レコード数", len(records_df))
+    unique_tag_count = tags_df['tag_id'].nunique()
+    st.sidebar.metric("ユニークタグ数", unique_tag_count)
     
     # 現在の状況
-    latest = data[-1] if data else {}
+    latest = records_df.iloc[-1]
+    latest_tag_ids = tags_df.loc[tags_df['record_idx'] == records_df.index[-1], 'tag_id'].tolist()
     
     st.header("🔄 現在の状況")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        current_seq = latest.get('sequence', '00')
-        seq_info = get_sequence_info(current_seq)
-        st.metric("現在のシーケンス", current_seq)
+        seq_info = get_sequence_info(int(latest['sequence']))
+        st.metric("現在のシーケンス", latest['raw_sequence'])
         st.markdown(f"<div style='background-color: {seq_info['bg_color']}; color: {seq_info['color']}; padding: 8px; border-radius: 5px; text-align: center; font-weight: bold; margin-top: 5px;'>{seq_info['label']}</div>", unsafe_allow_html=True)
     
     with col2:
-        st.metric("検出中のタグ数", latest.get('tag_count', 0))
+        st.metric("検出中のタグ数", int(latest['tag_count']))
     
     with col3:
-        st.metric("総タグ数", len(tag_histories))
+        st.metric("総タグ数", unique_tag_count)
     
     with col4:
         st.metric("最終更新", latest.get('timestamp', 'No data'))
@@ -254,7 +384,7 @@ def main():
     # シーケンス別稼働状況
     st.header("📈 シーケンス別稼働状況")
     
-    seq_stats = calculate_sequence_stats(data)
+    seq_stats = calculate_sequence_stats(records_df)
     
     # 稼働状況の可視化
     col1, col2 = st.columns(2)
@@ -265,7 +395,7 @@ def main():
         for seq, stats in seq_stats.items():
             seq_info = get_sequence_info(seq)
             stats_data.append({
-                'シーケンス': f"{seq}",
+                'シーケンス': f"{seq:02d}",
                 'ステータス': seq_info['label'],
                 '出現回数': stats['count'],
                 '出現率(%)': f"{stats['percentage']:.1f}",
@@ -281,34 +411,25 @@ def main():
         st.subheader("🥧 時間割合")
         
         # 円グラフ
-        labels = [f"seq={seq}<br>{get_sequence_info(seq)['label']}" for seq in seq_stats.keys()]
-        values = [stats['time_percentage'] for stats in seq_stats.values()]
-        colors = [get_sequence_info(seq)['color'] for seq in seq_stats.keys()]
+        labels, values, colors = zip(*[
+            (f"seq={seq:02d}<br>{info['label']}", seq_stats[seq]['time_percentage'], info['color'])
+            for seq, info in SEQUENCE_MAP.items()
+        ])
         
-        fig_pie = go.Figure(data=[go.Pie(
-            labels=labels,
-            values=values,
-            marker_colors=colors,
-            hole=0.3
-        )])
-        fig_pie.update_layout(
-            title="シーケンス別時間割合",
-            showlegend=True,
-            height=400
-        )
+        fig_pie = _build_pie(labels, values, colors)
         st.plotly_chart(fig_pie, use_container_width=True)
     
     # 全体サマリー
     st.subheader("📋 全体サマリー")
     col1, col2, col3, col4 = st.columns(4)
     
-    working_time = seq_stats.get('03', {}).get('total_duration', 0) + seq_stats.get('04', {}).get('total_duration', 0)
-    waiting_time = seq_stats.get('00', {}).get('total_duration', 0) + seq_stats.get('01', {}).get('total_duration', 0)
+    working_time = seq_stats.get(3, {}).get('total_duration', 0) + seq_stats.get(4, {}).get('total_duration', 0)
+    waiting_time = seq_stats.get(0, {}).get('total_duration', 0) + seq_stats.get(1, {}).get('total_duration', 0)
     total_time = sum(stats['total_duration'] for stats in seq_stats.values())
     efficiency = (working_time / total_time * 100) if total_time > 0 else 0
     
     with col1:
-        st.metric("総計測回数", len(data), help="全データレコード数")
+        st.metric("総計測回数", len(records_df), help="全データレコード数")
     with col2:
         st.metric("加工中時間", f"{working_time:.1f}分", help="seq=03,04の合計時間")
     with col3:
@@ -319,15 +440,14 @@ def main():
     st.markdown("---")
     
     # 現在検出中のタグ
-    if latest.get('tag_ids'):
+    if latest_tag_ids:
         st.header("🏷️ 現在検出中のタグ")
         
         # タグをカードスタイルで表示
-        cols = st.columns(min(3, len(latest['tag_ids'])))
-        for i, tag_id in enumerate(latest['tag_ids']):
+        cols = st.columns(min(3, len(latest_tag_ids)))
+        for i, tag_id in enumerate(latest_tag_ids):
             with cols[i % 3]:
-                display_tag = tag_id[:8] + "..." + tag_id[-8:] if len(tag_id) > 20 else tag_id
-                st.success(f"🏷️ **タグ {i+1}**\n\n`{display_tag}`")
+                st.success(f"🏷️ **タグ {i+1}**\n\n`{format_tag_id(tag_id)}`")
         
         st.markdown("---")
     
@@ -337,18 +457,14 @@ def main():
     with col1:
         st.header("📋 タグ履歴")
         
-        if tag_histories:
-            # 検出回数でソート
-            sorted_tags = sorted(tag_histories.items(), key=lambda x: len(x[1]), reverse=True)
-            
-            for tag_id, history in sorted_tags[:5]:  # 上位5個のタグを表示
-                with st.expander(f"🏷️ {tag_id[:8]}...{tag_id[-8:]} ({len(history)}回検出)"):
-                    history_df = pd.DataFrame(history)
-                    history_df = history_df.sort_values('datetime', ascending=False)
+        if not tags_df.empty:
+            for tag_id, count in get_top_tags(tags_df).items():  # 上位5個のタグを表示
+                with st.expander(f"🏷️ {format_tag_id(tag_id)} ({count}回検出)"):
+                    history_df = get_tag_history(records_df, tags_df, tag_id)
                     
-                    # 最近の履歴を表示
-                    recent_history = history_df.head(10)[['timestamp', 'sequence']].copy()
-                    recent_history['ステータス'] = recent_history['sequence'].apply(lambda x: get_sequence_info(x)['label'])
+                    # 最近の履歴を新しい順に表示
+                    recent_history = history_df.iloc[::-1].head(10)[['timestamp', 'raw_sequence', 'sequence']].copy()
+                    recent_history['sequence'] = recent_history['sequence'].map(SEQUENCE_LABELS).fillna(UNKNOWN_SEQ['label'])
                     recent_history.columns = ['時刻', 'seq', 'ステータス']
                     st.dataframe(recent_history, use_container_width=True, hide_index=True)
         else:
@@ -358,13 +474,12 @@ def main():
         st.header("⏰ 時系列ログ")
         
         # 最新20件を表示
-        if len(data) > 0:
-            df_display = pd.DataFrame(data[-20:])
-            df_display = df_display.sort_values('datetime', ascending=False)
-            df_display['ステータス'] = df_display['sequence'].apply(lambda x: get_sequence_info(x)['label'])
-            df_display_clean = df_display[['timestamp', 'sequence', 'ステータス', 'tag_count']].copy()
-            df_display_clean.columns = ['時刻', 'seq', 'ステータス', 'タグ数']
-            st.dataframe(df_display_clean, use_container_width=True, hide_index=True)
+        if len(records_df) > 0:
+            tail_df = records_df.iloc[::-1].head(20).assign(
+                status=lambda d: d['sequence'].map(SEQUENCE_LABELS).fillna(UNKNOWN_SEQ['label'])
+            )
+            df_display = tail_df[['timestamp', 'raw_sequence', 'status', 'tag_count']].set_axis(['時刻', 'seq', 'ステータス', 'タグ数'], axis=1)
+            st.dataframe(df_display, use_container_width=True, hide_index=True)
         else:
             st.info("ログデータがありません")
     
@@ -373,34 +488,17 @@ def main():
     # 時系列グラフ
     st.header("📊 時系列グラフ")
     
-    if len(data) > 1:
-        df_chart = pd.DataFrame(data)
-        df_chart['sequence_num'] = df_chart['sequence'].astype(int)
+    if len(records_df) > 1:
+        datetimes = records_df['datetime'].values
         
-        # シーケンス推移
-        fig = px.line(
-            df_chart, 
-            x='datetime', 
-            y='sequence_num',
-            title='シーケンス推移',
-            labels={'sequence_num': 'シーケンス', 'datetime': '時刻'},
-            markers=True
-        )
-        fig.update_layout(yaxis=dict(tickmode='array', tickvals=[0, 1, 2, 3, 4]))
-        fig.update_layout(height=400)
+        # シーケンス推移（不明なシーケンスは線を途切れさせる）
+        sequences = records_df['sequence'].where(records_df['sequence'] != UNKNOWN_SEQ_CODE).values
+        fig = _build_sequence_line(_content_key(datetimes, sequences), datetimes, sequences)
         st.plotly_chart(fig, use_container_width=True)
         
         # タグ数推移
-        fig2 = px.bar(
-            df_chart, 
-            x='datetime', 
-            y='tag_count',
-            title='検出タグ数推移',
-            labels={'tag_count': 'タグ数', 'datetime': '時刻'},
-            color='tag_count',
-            color_continuous_scale='viridis'
-        )
-        fig2.update_layout(height=400)
+        tag_counts = records_df['tag_count'].values
+        fig2 = _build_tag_count_bar(_content_key(datetimes, tag_counts), datetimes, tag_counts)
         st.plotly_chart(fig2, use_container_width=True)
     else:
         st.info("グラフ表示には2つ以上のデータポイントが必要です")